@@ -25,6 +25,7 @@
 
 
 from __future__ import print_function
+from collections import deque
 import sys
 import math
 import pygplates
@@ -55,6 +56,14 @@ else:
         return d.values()
     def listitems(d):
         return d.items()
+# Interning strings.
+try:
+    # Python 3
+    _intern = sys.intern
+except AttributeError:
+    # Python 2 - the builtin 'intern()' does not accept 'unicode', so just use strings as is.
+    def _intern(s):
+        return s
 
 
 # Required pygplates version.
@@ -62,10 +71,17 @@ else:
 PYGPLATES_VERSION_REQUIRED = pygplates.Version(21)
 
 
+# The topological property value types (bound once here to avoid looking them up in pygplates inside loops).
+_GPML_TOPOLOGICAL_LINE = pygplates.GpmlTopologicalLine
+_GPML_TOPOLOGICAL_POLYGON = pygplates.GpmlTopologicalPolygon
+_GPML_TOPOLOGICAL_NETWORK = pygplates.GpmlTopologicalNetwork
+
+
 def remove_features_not_referenced_by_topologies(
         feature_collections,
         restrict_referenced_feature_time_periods=False,
-        removed_features_collections=None):
+        removed_features_collections=None,
+        reference_cache=None):
     # Docstring in numpydoc format...
     """Remove any regular features not referenced by topological features.
     
@@ -87,6 +103,14 @@ def remove_features_not_referenced_by_topologies(
     removed_features_collections: list
         If an empty list is provided then it will be filled with one feature collection for each input feature collection.
         And each of these will contain any removed features.
+    reference_cache: dict
+        If a dict is provided then the topological references found in each feature are stored in it (keyed by feature ID string),
+        and re-used (instead of visiting the feature again) when a feature with the same feature ID is encountered
+        in subsequent calls that are passed the same dict. Features whose feature ID occurs more than once in a call
+        are always visited (and are not stored).
+        This assumes a feature ID identifies the same feature in all those calls. So if any topological features are
+        modified between calls (such as changing the sections of a topology), or a different feature with the same feature ID
+        is passed in a later call, then the dict must be cleared (or a new dict provided).
     
     Returns
     -------
@@ -95,19 +119,17 @@ def remove_features_not_referenced_by_topologies(
         Returned list is same length as ``feature_collections``.
     """
     
-    # Convert each feature collection into a list of features so we can more easily remove features
-    # and insert features at arbitrary locations within each feature collection
-    # (for example removing an unreferenced regular feature).
-    feature_collections = [list(pygplates.FeatureCollection(feature_collection))
+    # Convert each feature collection into a pygplates.FeatureCollection (if not already one).
+    #
+    # Input pygplates.FeatureCollection objects are not copied (we only iterate over their features below).
+    # They are also not modified, since a new pygplates.FeatureCollection is returned for each collection.
+    feature_collections = [feature_collection if isinstance(feature_collection, pygplates.FeatureCollection)
+            else pygplates.FeatureCollection(feature_collection)
         for feature_collection in feature_collections]
     
     # Set of feature IDs of all topological polygons and networks.
     # Note that we only keep topological lines if they are referenced by a topological polygon or network.
     feature_ids_of_topological_polygons_and_networks = set()
-    # Set of feature IDs referenced by all topological polygons and networks.
-    feature_ids_referenced_by_topological_polygons_and_networks = set()
-    # Set of feature IDs referenced by topological lines that are referenced by topological polygons and networks.
-    feature_ids_referenced_by_topological_lines_referenced_by_topological_polygons_and_networks = set()
     
     # The features referenced by topological polygons and networks.
     topological_polygon_and_network_references = []
@@ -117,43 +139,81 @@ def remove_features_not_referenced_by_topologies(
     # All features mapped by feature ID.
     all_features = dict()
     
+    # Each feature paired with its feature ID (one list per feature collection).
+    # This way we only need to query the feature ID of each feature once.
+    #
+    # Note that we use interned feature ID strings (rather than pygplates.FeatureId) throughout.
+    # This makes the many sets and dicts keyed by feature ID smaller and faster to look up
+    # (since string hashes are cached and interned strings compare equal by identity).
+    feature_ids_and_features_in_collections = [
+        [(_intern(feature.get_feature_id().get_string()), feature) for feature in feature_collection]
+        for feature_collection in feature_collections]
+    
+    # Feature IDs that occur more than once (only needed if a cache was provided).
+    # These features are always visited (and never cached) since a feature ID does not identify a single feature.
+    duplicate_feature_ids = set()
+    if reference_cache is not None:
+        feature_ids_seen = set()
+        for feature_ids_and_features in feature_ids_and_features_in_collections:
+            for feature_id, feature in feature_ids_and_features:
+                if feature_id in feature_ids_seen:
+                    duplicate_feature_ids.add(feature_id)
+                else:
+                    feature_ids_seen.add(feature_id)
+    
     # Find all topological features and their references to regular features.
-    topological_reference_visitor = _TopologicalReferenceVisitor()
-    for feature_collection in feature_collections:
-        for feature in feature_collection:
-            feature_id = feature.get_feature_id()
-            
-            # Enable any feature to be looked up using its feature ID.
-            all_features[feature_id] = feature
-            
+    for feature_ids_and_features in feature_ids_and_features_in_collections:
+        # Enable any feature to be looked up using its feature ID.
+        all_features.update(feature_ids_and_features)
+        
+        for feature_id, feature in feature_ids_and_features:
             # See if the current feature has a topological geometry and (if so) find the features it references.
-            topology_type, topological_references = topological_reference_visitor.visit_feature(feature)
+            # If a cache was provided then we only need to visit the current feature if it's not in the cache
+            # (from a previous call).
+            if reference_cache is not None and feature_id not in duplicate_feature_ids:
+                topology_type_and_references = reference_cache.get(feature_id)
+                if topology_type_and_references is None:
+                    topology_type_and_references = _find_topological_references(feature)
+                    reference_cache[feature_id] = topology_type_and_references
+            else:
+                topology_type_and_references = _find_topological_references(feature)
+            topology_type, topological_references = topology_type_and_references
             
             # For topological lines, we'll just keep track of their references for later since we don't yet know
             # which topological lines (if any) will in turn be referenced by topological polygons and  networks.
-            if topology_type == pygplates.GpmlTopologicalLine:
+            if topology_type == _GPML_TOPOLOGICAL_LINE:
                 topological_line_references[feature_id] = (feature, topological_references)
             # For topological polygons and networks, we know they get included straight away.
-            elif (topology_type == pygplates.GpmlTopologicalPolygon or
-                topology_type == pygplates.GpmlTopologicalNetwork):
-                topological_polygon_and_network_references.append((feature, topological_references))
+            elif (topology_type == _GPML_TOPOLOGICAL_POLYGON or
+                topology_type == _GPML_TOPOLOGICAL_NETWORK):
+                topological_polygon_and_network_references.append((feature_id, feature, topological_references))
                 # Add the current topological polygon or network.
                 feature_ids_of_topological_polygons_and_networks.add(feature_id)
             # else it's not a topological feature, so ignore it.
     
     # Referenced time periods of referenced feature (non-topological and topological lines).
+    # These are only filled (and used) if we're restricting the time periods of referenced features.
     time_periods_of_referenced_non_topological_features = dict()
     time_periods_of_referenced_topological_line_features = dict()
     
     # Set of feature IDs of topological lines that are referenced by topological polygons and networks.
     feature_ids_of_topological_lines_referenced_by_topological_polygons_and_networks = set()
     
+    # The feature IDs referenced by each topological polygon, network and line (mapped by feature ID of the topology).
+    # Only includes those referenced in time periods that overlap the valid time period of the topology.
+    referenced_feature_ids_of_topologies = dict()
+    
     # Start with begin time as -inf (so that it can only get larger with max() function) and
     # end time as +inf (so that it can only get smaller with min() function).
     uninitialised_time_period = float('-inf'), float('inf')  # begin_time, end_time
     
     # Find features directly referenced by topological polygons and networks.
-    for topological_polygon_and_network_feature, topological_polygon_and_network_reference in topological_polygon_and_network_references:
+    for (topological_polygon_and_network_feature_id,
+         topological_polygon_and_network_feature,
+         topological_polygon_and_network_reference) in topological_polygon_and_network_references:
+        # The sets of features referenced in those time periods that overlap the topological polygon/network valid time.
+        feature_ids_referenced_in_overlapping_time_periods = []
+        
         topological_polygon_and_network_begin_time, topological_polygon_and_network_end_time = topological_polygon_and_network_feature.get_valid_time()
         for (reference_begin_time, reference_end_time), feature_ids_referenced_in_time_period in topological_polygon_and_network_reference:
             # Restrict the current referenced time period to that of the topological polygon (or network) valid time period.
@@ -165,7 +225,7 @@ def remove_features_not_referenced_by_topologies(
             # If the referenced time period and the topological polygon/network valid time overlap.
             if reference_begin_time >= reference_end_time:
                 # Add the features referenced by the current topological polygon or network.
-                feature_ids_referenced_by_topological_polygons_and_networks.update(feature_ids_referenced_in_time_period)
+                feature_ids_referenced_in_overlapping_time_periods.append(feature_ids_referenced_in_time_period)
             
                 # Iterate over referenced feature IDs for the currently reference time period.
                 for referenced_feature_id in feature_ids_referenced_in_time_period:
@@ -176,12 +236,22 @@ def remove_features_not_referenced_by_topologies(
                     else:
                         time_periods_of_referenced_features = time_periods_of_referenced_non_topological_features
                     
+                    # The time periods referenced by topological polygons and networks are only needed if we're restricting time periods.
+                    # Otherwise we only need the topological lines referenced (and the set of feature IDs referenced).
+                    if not restrict_referenced_feature_time_periods:
+                        continue
+                    
                     # The current referenced feature needs to include the time period referenced by the topological polygon (or network).
                     referenced_feature_max_begin_time, referenced_feature_min_end_time = (
                         time_periods_of_referenced_features.get(referenced_feature_id, uninitialised_time_period))
                     time_periods_of_referenced_features[referenced_feature_id] = (
                         max(referenced_feature_max_begin_time, reference_begin_time),
                         min(referenced_feature_min_end_time, reference_end_time))
+        
+        _add_referenced_feature_ids(
+            referenced_feature_ids_of_topologies,
+            topological_polygon_and_network_feature_id,
+            feature_ids_referenced_in_overlapping_time_periods)
     
     if restrict_referenced_feature_time_periods:
         # Restrict the valid time periods of all referenced *topological line* features such that they are limited by the time periods of the referencing topologies.
@@ -201,6 +271,9 @@ def remove_features_not_referenced_by_topologies(
     # Iterate over topological lines referenced by topological polygons and networks.
     for referenced_topological_line_feature_id in feature_ids_of_topological_lines_referenced_by_topological_polygons_and_networks:
         topological_line_feature, topological_line_reference = topological_line_references[referenced_topological_line_feature_id]
+        # The sets of features referenced in those time periods that overlap the topological line valid time.
+        feature_ids_referenced_in_overlapping_time_periods = []
+        
         topological_line_begin_time, topological_line_end_time = topological_line_feature.get_valid_time()
         for (reference_begin_time, reference_end_time), feature_ids_referenced_in_time_period in topological_line_reference:
             # Restrict the current referenced time period to that of the topological line valid time period.
@@ -212,7 +285,12 @@ def remove_features_not_referenced_by_topologies(
             # If the referenced time period and the topological line valid time overlap.
             if reference_begin_time >= reference_end_time:
                 # Add the features referenced by the current topological line (which is referenced by a topological polygon or network).
-                feature_ids_referenced_by_topological_lines_referenced_by_topological_polygons_and_networks.update(feature_ids_referenced_in_time_period)
+                feature_ids_referenced_in_overlapping_time_periods.append(feature_ids_referenced_in_time_period)
+                
+                # The time periods referenced by topological lines are only needed if we're restricting time periods.
+                # Otherwise we only need the (flattened) set of feature IDs referenced by the topological line.
+                if not restrict_referenced_feature_time_periods:
+                    continue
                 
                 # Iterate over referenced feature IDs for the currently referenced time period.
                 for referenced_feature_id in feature_ids_referenced_in_time_period:
@@ -222,6 +300,11 @@ def remove_features_not_referenced_by_topologies(
                     time_periods_of_referenced_non_topological_features[referenced_feature_id] = (
                         max(referenced_feature_max_begin_time, reference_begin_time),
                         min(referenced_feature_min_end_time, reference_end_time))
+        
+        _add_referenced_feature_ids(
+            referenced_feature_ids_of_topologies,
+            referenced_topological_line_feature_id,
+            feature_ids_referenced_in_overlapping_time_periods)
     
     if restrict_referenced_feature_time_periods:
         # Restrict the valid time periods of all referenced *non-topological* features such that they are limited by the time periods of the referencing topologies.
@@ -242,131 +325,223 @@ def remove_features_not_referenced_by_topologies(
     # or indirectly by them. For example, a topological polygon might reference a topological line which
     # in turn references regular features. In this case the topological line and the features it references
     # must all be kept.
-    feature_ids_to_keep = (feature_ids_of_topological_polygons_and_networks |
-                           feature_ids_referenced_by_topological_polygons_and_networks |
-                           feature_ids_referenced_by_topological_lines_referenced_by_topological_polygons_and_networks)
-    for feature_collection in feature_collections:
-        # Create an extra feature collection (containing removed features) for each feature collection.
-        if removed_features_collections is not None:
-            removed_features_collection = pygplates.FeatureCollection()
-            removed_features_collections.append(removed_features_collection)
+    #
+    # So we traverse the references starting at the topological polygons and networks (using a queue of
+    # feature IDs still to visit) - only topologies have references, so other features end the traversal.
+    feature_ids_to_keep = set(feature_ids_of_topological_polygons_and_networks)
+    feature_ids_to_visit = deque(feature_ids_to_keep)
+    while feature_ids_to_visit:
+        feature_id = feature_ids_to_visit.popleft()
+        for referenced_feature_id in referenced_feature_ids_of_topologies.get(feature_id, ()):
+            if referenced_feature_id not in feature_ids_to_keep:
+                feature_ids_to_keep.add(referenced_feature_id)
+                feature_ids_to_visit.append(referenced_feature_id)
+    
+    # Create a new feature collection containing the kept features of each feature collection.
+    #
+    # Note that we don't remove the unreferenced features from each feature collection since
+    # pygplates.FeatureCollection.remove() searches the collection for each feature removed.
+    output_feature_collections = []
+    for feature_ids_and_features in feature_ids_and_features_in_collections:
+        output_feature_collections.append(pygplates.FeatureCollection(
+            [feature for feature_id, feature in feature_ids_and_features if feature_id in feature_ids_to_keep]))
         
-        feature_index = 0
-        while feature_index < len(feature_collection):
-            feature = feature_collection[feature_index]
-            feature_id = feature.get_feature_id()
-            if feature_id not in feature_ids_to_keep:
-                del feature_collection[feature_index]
-                feature_index -= 1
-                
-                # Keep track of the removed feature if requested.
-                if removed_features_collections is not None:
-                    removed_features_collection.add(feature)
-            
-            feature_index += 1
+        # Keep track of the removed features if requested.
+        if removed_features_collections is not None:
+            removed_features_collections.append(pygplates.FeatureCollection(
+                [feature for feature_id, feature in feature_ids_and_features if feature_id not in feature_ids_to_keep]))
     
     # Return our (potentially) modified feature collections as a list of pygplates.FeatureCollection.
-    return [pygplates.FeatureCollection(feature_collection)
-        for feature_collection in feature_collections]
+    return output_feature_collections
 
 
-# Private helper class (has '_' prefix) to find topology-related GpmlPropertyDelegate's.
-class _TopologicalReferenceVisitor(pygplates.PropertyValueVisitor):
-    ALL_TIME = float('inf'), float('-inf')  # begin_time, end_time
-    
-    def __init__(self):
-        super(_TopologicalReferenceVisitor, self).__init__()
-    
-    def visit_feature(self, feature):
-        self.topology_type = None
-        self.references = []
-        self.current_time_period = self.ALL_TIME
-        
-        # Visit all properties in the feature to find a topological line, polygon or network.
-        for property in feature:
-            # Get the top-level property value (containing all times) not just a specific time.
-            property_value = property.get_time_dependent_value()
-            # Visit the property value.
-            property_value.accept_visitor(self)
-            # If we visited a topological line, polygon or network then we're finished with the current feature.
-            if self.topology_type:
-                break
-        
-        return self.topology_type, self.references
-    
-    def visit_gpml_constant_value(self, gpml_constant_value):
-        # Visit the GpmlConstantValue's nested property value.
-        gpml_constant_value.get_value().accept_visitor(self)
-    
-    def visit_gpml_piecewise_aggregation(self, gpml_piecewise_aggregation):
-        # Only need to visit if contains a topological line, polygon or network.
-        value_type = gpml_piecewise_aggregation.get_value_type()
-        if (value_type == pygplates.GpmlTopologicalLine or
-            value_type == pygplates.GpmlTopologicalPolygon or
-            value_type == pygplates.GpmlTopologicalNetwork):
-            
-            # NOTE: If there's only *one* time window then we ignore its time period.
-            #
-            # We do this for the same reason that GPlates does this (this comment from the GPlates source code)...
-            #
-            # This is because GPML files created with old versions of GPlates set the time period,
-            # of the sole time window, to match that of the 'feature's time period (in the topology
-            # build/edit tools) - newer versions set it to *all* time (distant past/future) - in fact
-            # newer versions just use a GpmlConstantValue instead of GpmlPiecewiseAggregation because
-            # the topology tools cannot yet create time-dependent topology (section) lists.
-            # With old versions if the user expanded the 'feature's time period *after* building/editing
-            # the topology then the *un-adjusted* time window time period will be incorrect and hence
-            # we need to ignore it here.
-            # Those old versions were around 4 years ago (prior to GPlates 1.3) - so we really shouldn't
-            # be seeing any old topologies.
-            # Actually I can see there are some currently in the sample data for GPlates 2.0.
-            # So as a compromise we'll ignore the reconstruction time if there's only one time window
-            # (a single time window shouldn't really have any time constraints on it anyway)
-            # and respect the reconstruction time if there's more than one time window
-            # (since multiple time windows need non-overlapping time constraints).
-            # This is especially true now that pyGPlates will soon be able to generate time-dependent
-            # topologies (where the reconstruction time will need to be respected otherwise multiple
-            # networks from different time periods will get created instead of just one of them).
-            if len(gpml_piecewise_aggregation) == 1:
-                # Assume the sole time window covers *all* time (the default).
-                gpml_piecewise_aggregation[0].get_value().accept_visitor(self)
-            else:
-                # Visit the property value in each time window.
-                for gpml_time_window in gpml_piecewise_aggregation:
-                    # Restrict the time period while we're visiting the time window.
-                    self.current_time_period = gpml_time_window.get_begin_time(), gpml_time_window.get_end_time()
-                    gpml_time_window.get_value().accept_visitor(self)
-                    self.current_time_period = self.ALL_TIME
-    
-    def visit_gpml_topological_line(self, gpml_topological_line):
-        referenced_feature_ids = set()
-        # Topological line sections are topological sections (which contain a property delegate).
-        for section in gpml_topological_line.get_sections():
-            referenced_feature_ids.add(section.get_property_delegate().get_feature_id())
+# Private helper function (has '_' prefix) to combine sets of feature IDs into a single set.
+def _union_of_feature_ids(feature_id_sets):
+    # Avoid copying when there's only a single set (such as a topology with only one time window).
+    if len(feature_id_sets) == 1:
+        return feature_id_sets[0]
+    
+    # Build the combined set in one go (rather than repeatedly updating a set).
+    return set().union(*feature_id_sets)
+
+
+# Private helper function (has '_' prefix) to add the sets of feature IDs referenced by a topology to those
+# already added for the same topology feature ID (for example, a topology duplicated in two feature collections).
+def _add_referenced_feature_ids(referenced_feature_ids_of_topologies, topology_feature_id, feature_id_sets):
+    existing_referenced_feature_ids = referenced_feature_ids_of_topologies.get(topology_feature_id)
+    if existing_referenced_feature_ids is not None:
+        # Note that we combine into a new set rather than modifying the existing set in place, since the latter
+        # might also be a set of topological references (eg, held by a reference cache).
+        feature_id_sets = [existing_referenced_feature_ids] + feature_id_sets
+    
+    referenced_feature_ids_of_topologies[topology_feature_id] = _union_of_feature_ids(feature_id_sets)
+
+
+# Private exception (has '_' prefix) raised when a topological line, polygon or network has been found in a feature
+# (to return directly to '_find_topological_references()' through any nested visits).
+class _FoundTopology(Exception):
+    pass
+
+
+#
+# Private helper functions (have '_' prefix) to find topology-related GpmlPropertyDelegate's.
+#
+# Each property value is dispatched on its type (see '_VISIT_PROPERTY_VALUE_FUNCTIONS') to a visit function
+# that accepts the property value and a 'state' dict containing:
+#   'topology_type'       - the topological type found (or None if not yet found),
+#   'references'          - list of (time period, set of referenced feature ID strings) found so far,
+#   'current_time_period' - the time period of the time window currently being visited.
+#
+# This avoids subclassing pygplates.PropertyValueVisitor, where each 'accept_visitor()' is a round trip through pygplates.
+#
+
+_ALL_TIME = float('inf'), float('-inf')  # begin_time, end_time
+
+# The topological property value types.
+_TOPOLOGICAL_TYPES = frozenset((
+    _GPML_TOPOLOGICAL_LINE,
+    _GPML_TOPOLOGICAL_POLYGON,
+    _GPML_TOPOLOGICAL_NETWORK))
+
+
+# Returns True if a (top-level) property value is, or can contain, a topological line, polygon or network.
+def _can_contain_topology(property_value):
+    property_value_type = type(property_value)
+    # Note: Only GpmlPiecewiseAggregation has 'get_value_type()' (GpmlConstantValue does not).
+    if property_value_type is pygplates.GpmlConstantValue:
+        return type(property_value.get_value()) in _TOPOLOGICAL_TYPES
+    if property_value_type is pygplates.GpmlPiecewiseAggregation:
+        return property_value.get_value_type() in _TOPOLOGICAL_TYPES
+    
+    return property_value_type in _TOPOLOGICAL_TYPES
+
+
+# Returns the topology type of a feature (or None if not topological) and its topological references
+# (as a list of (time period, set of referenced feature ID strings)).
+def _find_topological_references(feature):
+    state = {
+        'topology_type': None,
+        'references': [],
+        'current_time_period': _ALL_TIME}
+    
+    # Visit all properties in the feature to find a topological line, polygon or network.
+    for property in feature:
+        # Get the top-level property value (containing all times) not just a specific time.
+        property_value = property.get_time_dependent_value()
         
-        self.topology_type = pygplates.GpmlTopologicalLine
-        self.references.append((self.current_time_period, referenced_feature_ids))
-    
-    def visit_gpml_topological_polygon(self, gpml_topological_polygon):
-        referenced_feature_ids = set()
-        # Topological polygon exterior sections are topological sections (which contain a property delegate).
-        for exterior_section in gpml_topological_polygon.get_exterior_sections():
-            referenced_feature_ids.add(exterior_section.get_property_delegate().get_feature_id())
+        # Skip property values that cannot contain a topological line, polygon or network
+        # (which is most properties since most features are not topological).
+        if not _can_contain_topology(property_value):
+            continue
         
-        self.topology_type = pygplates.GpmlTopologicalPolygon
-        self.references.append((self.current_time_period, referenced_feature_ids))
-    
-    def visit_gpml_topological_network(self, gpml_topological_network):
-        referenced_feature_ids = set()
-        # Topological network boundary sections are topological sections (which contain a property delegate).
-        for boundary_section in gpml_topological_network.get_boundary_sections():
-            referenced_feature_ids.add(boundary_section.get_property_delegate().get_feature_id())
-        # Topological network interiors are already property delegates.
-        for interior in gpml_topological_network.get_interiors():
-            referenced_feature_ids.add(interior.get_feature_id())
+        # Visit the property value.
+        try:
+            _visit_property_value(property_value, state)
+        except _FoundTopology:
+            # We visited a topological line, polygon or network so we're finished with the current feature.
+            break
+    
+    return state['topology_type'], state['references']
+
+
+def _visit_property_value(property_value, state):
+    # Property values of types we're not interested in are ignored.
+    visit_function = _VISIT_PROPERTY_VALUE_FUNCTIONS.get(type(property_value))
+    if visit_function:
+        visit_function(property_value, state)
+
+
+def _visit_gpml_constant_value(gpml_constant_value, state):
+    # Visit the GpmlConstantValue's nested property value.
+    _visit_property_value(gpml_constant_value.get_value(), state)
+
+
+def _visit_gpml_piecewise_aggregation(gpml_piecewise_aggregation, state):
+    # Note: '_can_contain_topology()' has already checked that the value type is a topological line, polygon or network
+    #       (so we don't call 'get_value_type()' again here).
+    
+    # NOTE: If there's only *one* time window then we ignore its time period.
+    #
+    # We do this for the same reason that GPlates does this (this comment from the GPlates source code)...
+    #
+    # This is because GPML files created with old versions of GPlates set the time period,
+    # of the sole time window, to match that of the 'feature's time period (in the topology
+    # build/edit tools) - newer versions set it to *all* time (distant past/future) - in fact
+    # newer versions just use a GpmlConstantValue instead of GpmlPiecewiseAggregation because
+    # the topology tools cannot yet create time-dependent topology (section) lists.
+    # With old versions if the user expanded the 'feature's time period *after* building/editing
+    # the topology then the *un-adjusted* time window time period will be incorrect and hence
+    # we need to ignore it here.
+    # Those old versions were around 4 years ago (prior to GPlates 1.3) - so we really shouldn't
+    # be seeing any old topologies.
+    # Actually I can see there are some currently in the sample data for GPlates 2.0.
+    # So as a compromise we'll ignore the reconstruction time if there's only one time window
+    # (a single time window shouldn't really have any time constraints on it anyway)
+    # and respect the reconstruction time if there's more than one time window
+    # (since multiple time windows need non-overlapping time constraints).
+    # This is especially true now that pyGPlates will soon be able to generate time-dependent
+    # topologies (where the reconstruction time will need to be respected otherwise multiple
+    # networks from different time periods will get created instead of just one of them).
+    if len(gpml_piecewise_aggregation) == 1:
+        # Assume the sole time window covers *all* time (the default).
+        _visit_property_value(gpml_piecewise_aggregation[0].get_value(), state)
+    else:
+        # Visit the property value in each time window.
+        for gpml_time_window in gpml_piecewise_aggregation:
+            # Restrict the time period while we're visiting the time window.
+            state['current_time_period'] = gpml_time_window.get_begin_time(), gpml_time_window.get_end_time()
+            try:
+                _visit_property_value(gpml_time_window.get_value(), state)
+            except _FoundTopology:
+                # Keep visiting the remaining time windows (they can reference different features).
+                pass
+            state['current_time_period'] = _ALL_TIME
         
-        self.topology_type = pygplates.GpmlTopologicalNetwork
-        self.references.append((self.current_time_period, referenced_feature_ids))
+        # Now that all time windows are visited we can finish with the current feature.
+        if state['topology_type']:
+            raise _FoundTopology
+
+
+def _visit_gpml_topological_line(gpml_topological_line, state):
+    # Topological line sections are topological sections (which contain a property delegate).
+    referenced_feature_ids = set(_intern(section.get_property_delegate().get_feature_id().get_string())
+        for section in gpml_topological_line.get_sections())
+    
+    state['topology_type'] = _GPML_TOPOLOGICAL_LINE
+    state['references'].append((state['current_time_period'], referenced_feature_ids))
+    raise _FoundTopology
+
+
+def _visit_gpml_topological_polygon(gpml_topological_polygon, state):
+    # Topological polygon exterior sections are topological sections (which contain a property delegate).
+    referenced_feature_ids = set(_intern(exterior_section.get_property_delegate().get_feature_id().get_string())
+        for exterior_section in gpml_topological_polygon.get_exterior_sections())
+    
+    state['topology_type'] = _GPML_TOPOLOGICAL_POLYGON
+    state['references'].append((state['current_time_period'], referenced_feature_ids))
+    raise _FoundTopology
+
+
+def _visit_gpml_topological_network(gpml_topological_network, state):
+    # Topological network boundary sections are topological sections (which contain a property delegate).
+    referenced_feature_ids = set(_intern(boundary_section.get_property_delegate().get_feature_id().get_string())
+        for boundary_section in gpml_topological_network.get_boundary_sections())
+    # Topological network interiors are already property delegates.
+    referenced_feature_ids.update(_intern(interior.get_feature_id().get_string())
+        for interior in gpml_topological_network.get_interiors())
+    
+    state['topology_type'] = _GPML_TOPOLOGICAL_NETWORK
+    state['references'].append((state['current_time_period'], referenced_feature_ids))
+    raise _FoundTopology
+
+
+# The visit function for each property value type that we're interested in.
+_VISIT_PROPERTY_VALUE_FUNCTIONS = {
+    pygplates.GpmlConstantValue: _visit_gpml_constant_value,
+    pygplates.GpmlPiecewiseAggregation: _visit_gpml_piecewise_aggregation,
+    _GPML_TOPOLOGICAL_LINE: _visit_gpml_topological_line,
+    _GPML_TOPOLOGICAL_POLYGON: _visit_gpml_topological_polygon,
+    _GPML_TOPOLOGICAL_NETWORK: _visit_gpml_topological_network}
 
 
 if __name__ == '__main__':
@@ -0,0 +1,97 @@
+import pytest
+
+pygplates = pytest.importorskip('pygplates')
+
+# Importing the "ptt" package also imports its other dependencies (eg, cartopy).
+cleanup_topologies = pytest.importorskip('ptt.cleanup_topologies')
+
+
+def _create_regular_feature():
+    feature = pygplates.Feature()
+    feature.set_geometry(pygplates.PolylineOnSphere([(0, 0), (0, 10)]))
+    return feature
+
+
+def _create_topological_polygon(referenced_features, feature_id=None):
+    feature = pygplates.Feature(pygplates.FeatureType.gpml_topological_closed_plate_boundary, feature_id)
+    feature.set_topological_geometry(pygplates.GpmlTopologicalPolygon(
+        [pygplates.GpmlTopologicalSection.create(referenced_feature, topological_geometry_type=pygplates.GpmlTopologicalPolygon)
+            for referenced_feature in referenced_features]))
+    return feature
+
+
+def _feature_ids(feature_collection):
+    return set(feature.get_feature_id().get_string() for feature in feature_collection)
+
+
+def test_features_referenced_by_duplicate_topology_feature_ids_are_kept():
+    # Two topological polygons with the same feature ID (eg, duplicated across files) referencing different features.
+    regular_features = [_create_regular_feature() for _ in range(3)]
+    topology_feature_id = pygplates.FeatureId.create_unique_id()
+    topologies = [
+        _create_topological_polygon([regular_features[0]], topology_feature_id),
+        _create_topological_polygon([regular_features[1]], topology_feature_id)]
+
+    output_feature_collections = cleanup_topologies.remove_features_not_referenced_by_topologies(
+        [[topologies[0], regular_features[0], regular_features[2]], [topologies[1], regular_features[1]]])
+
+    # Only the unreferenced regular feature is removed.
+    assert _feature_ids(output_feature_collections[0]) == _feature_ids([topologies[0], regular_features[0]])
+    assert _feature_ids(output_feature_collections[1]) == _feature_ids([topologies[1], regular_features[1]])
+
+
+def test_same_feature_collection_passed_twice():
+    regular_features = [_create_regular_feature() for _ in range(2)]
+    topology = _create_topological_polygon([regular_features[0]])
+    feature_collection = pygplates.FeatureCollection([topology] + regular_features)
+
+    output_feature_collections = cleanup_topologies.remove_features_not_referenced_by_topologies(
+        [feature_collection, feature_collection])
+
+    assert [len(output_feature_collection) for output_feature_collection in output_feature_collections] == [2, 2]
+    # The input feature collection is not modified.
+    assert len(feature_collection) == 3
+    for output_feature_collection in output_feature_collections:
+        assert _feature_ids(output_feature_collection) == _feature_ids([topology, regular_features[0]])
+
+
+def test_topologies_in_constant_and_piecewise_values_are_found():
+    regular_features = [_create_regular_feature() for _ in range(3)]
+    # Topological polygon in a GpmlConstantValue (the default).
+    constant_topology = _create_topological_polygon([regular_features[0]])
+    # Topological polygon in a GpmlPiecewiseAggregation with two time windows.
+    piecewise_topology = pygplates.Feature(pygplates.FeatureType.gpml_topological_closed_plate_boundary)
+    piecewise_topology.set(
+        pygplates.PropertyName.gpml_boundary,
+        pygplates.GpmlPiecewiseAggregation([
+            pygplates.GpmlTimeWindow(
+                pygplates.GpmlTopologicalPolygon([
+                    pygplates.GpmlTopologicalSection.create(regular_features[1], topological_geometry_type=pygplates.GpmlTopologicalPolygon)]),
+                100, 0),
+            pygplates.GpmlTimeWindow(
+                pygplates.GpmlTopologicalPolygon([
+                    pygplates.GpmlTopologicalSection.create(regular_features[1], topological_geometry_type=pygplates.GpmlTopologicalPolygon)]),
+                200, 100)]),
+        verify_information_model=pygplates.VerifyInformationModel.no)
+
+    output_feature_collections = cleanup_topologies.remove_features_not_referenced_by_topologies(
+        [[constant_topology, piecewise_topology] + regular_features])
+
+    assert _feature_ids(output_feature_collections[0]) == _feature_ids(
+        [constant_topology, piecewise_topology, regular_features[0], regular_features[1]])
+
+
+def test_reference_cache_with_duplicate_topology_feature_ids():
+    regular_features = [_create_regular_feature() for _ in range(2)]
+    topology_feature_id = pygplates.FeatureId.create_unique_id()
+    topologies = [
+        _create_topological_polygon([regular_features[0]], topology_feature_id),
+        _create_topological_polygon([regular_features[1]], topology_feature_id)]
+
+    # Calling again with the same cache gives the same result.
+    reference_cache = {}
+    for _ in range(2):
+        output_feature_collections = cleanup_topologies.remove_features_not_referenced_by_topologies(
+            [[topologies[0], regular_features[0]], [topologies[1], regular_features[1]]],
+            reference_cache=reference_cache)
+        assert [len(output_feature_collection) for output_feature_collection in output_feature_collections] == [2, 2]